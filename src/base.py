@@ -19,6 +19,56 @@ from plotly.subplots import make_subplots
 import requests
 import json
 
+# Row count above which create_analysis_charts switches to pre-aggregated traces
+LARGE_DATA_THRESHOLD = 10000
+
+def downsample(df, max_points, seed=42):
+    """Uniform random sample of at most max_points rows (without replacement)"""
+    if len(df) <= max_points:
+        return df
+    rng = np.random.default_rng(seed)
+    return df.iloc[np.sort(rng.choice(len(df), max_points, replace=False))]
+
+def binned_histogram(values, nbins, name=None):
+    """Histogram pre-binned in NumPy as a bar trace (size independent of row count)"""
+    values = np.asarray(values, dtype=float)
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=nbins)
+    return go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges), name=name)
+
+def precomputed_box(df, x, y):
+    """Box plot from per-group quantiles computed in NumPy (Tukey fences, no outlier points)"""
+    groups = df.groupby(x)[y]
+    quantiles = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    q1, median, q3 = quantiles[0.25], quantiles[0.5], quantiles[0.75]
+    iqr = q3 - q1
+    lower = np.maximum(groups.min(), q1 - 1.5 * iqr)
+    upper = np.minimum(groups.max(), q3 + 1.5 * iqr)
+    return go.Box(x=quantiles.index, q1=q1, median=median, q3=q3,
+                  lowerfence=lower, upperfence=upper, boxpoints=False)
+
+def raw_need_score(homeless_count, service_capacity, mental_health_services, substance_abuse_services,
+                   job_training_centers, healthcare_facilities, pit_growth=None, growth_weight=0.1):
+    """
+    Weighted need score before normalization (higher = more need).
+    Works element-wise on Series or on (draws x zips) arrays.
+    """
+    def coverage(services):
+        return np.clip(services / homeless_count * 1000, 0, 100)
+
+    score = (
+        (homeless_count - service_capacity) * 0.4 +
+        (100 - coverage(mental_health_services)) * 0.2 +
+        (100 - coverage(substance_abuse_services)) * 0.15 +
+        (100 - coverage(job_training_centers)) * 0.15 +
+        (100 - coverage(healthcare_facilities)) * 0.1
+    )
+
+    # Year-over-year PIT growth, capped at +/-100%
+    if pit_growth is not None:
+        score = score + np.clip(pit_growth, -1, 1) * 100 * growth_weight
+
+    return score
+
 class HackathonHomelessModel:
     """
     Quick hackathon model for San Diego homeless services gap analysis
@@ -101,9 +151,39 @@ class HackathonHomelessModel:
 
         return pd.DataFrame(data)
 
-    def calculate_service_gaps(self, df):
+    def apply_zip_aggregates(self, df, zip_aggregates):
+        """
+        Replace mock per-zip service counts with spatially joined counts
+        (see spatial_join.build_zip_aggregates)
+        """
+        from spatial_join import services_by_zip
+
+        model_columns = services_by_zip(zip_aggregates)
+        zip_keys = df['zip_code'].astype(str)
+
+        for column in model_columns.columns:
+            df[column] = zip_keys.map(model_columns[column]).fillna(0).to_numpy()
+
+        return df
+
+    def apply_pit_growth(self, df, growth_features, key='zip_code'):
+        """
+        Add PIT growth rates (see pit_store.PITCountStore.growth_features) as columns
+        so need scoring and the predictive model can use them
+        """
+        keys = df[key].astype(str)
+        growth_features = growth_features.copy()
+        growth_features.index = growth_features.index.astype(str)
+
+        for column in ['pit_growth', 'pit_cagr']:
+            df[column] = keys.map(growth_features[column]).fillna(0).to_numpy()
+
+        return df
+
+    def calculate_service_gaps(self, df, growth_weight=0.1):
         """
         Calculate various service gap metrics
+        (growing PIT counts raise need when a pit_growth column is present)
         """
         # Basic capacity gap
         df['capacity_gap'] = df['homeless_count'] - df['service_capacity']
@@ -118,12 +198,12 @@ class HackathonHomelessModel:
         df['healthcare_score'] = (df['healthcare_facilities'] / df['homeless_count'] * 1000).clip(0, 100)
 
         # Overall need score (higher = more need)
-        df['need_score'] = (
-            df['capacity_gap'] * 0.4 +
-            (100 - df['mental_health_score']) * 0.2 +
-            (100 - df['substance_abuse_score']) * 0.15 +
-            (100 - df['job_training_score']) * 0.15 +
-            (100 - df['healthcare_score']) * 0.1
+        df['need_score'] = raw_need_score(
+            df['homeless_count'], df['service_capacity'],
+            df['mental_health_services'], df['substance_abuse_services'],
+            df['job_training_centers'], df['healthcare_facilities'],
+            pit_growth=df['pit_growth'] if 'pit_growth' in df else None,
+            growth_weight=growth_weight
         )
 
         # Normalize need score to 0-100
@@ -139,6 +219,7 @@ class HackathonHomelessModel:
         features = ['homeless_count', 'unsheltered', 'poverty_rate',
                    'unemployment_rate', 'median_income', 'median_rent',
                    'num_services', 'service_capacity', 'population']
+        features += [f for f in ['pit_growth', 'pit_cagr'] if f in df]
 
         X = df[features]
         y = df['need_score']
@@ -225,9 +306,10 @@ class HackathonHomelessModel:
 
         return recommendations
 
-    def create_dashboard_map(self, df, priority_areas):
+    def create_dashboard_map(self, df, priority_areas, hotspots=None):
         """
         Create interactive map for dashboard
+        hotspots (see hotspots.hotspot_analysis) are drawn as one polygon layer
         """
         # Create base map
         m = folium.Map(location=[32.7157, -117.1611], zoom_start=10)
@@ -273,6 +355,21 @@ class HackathonHomelessModel:
                 fill=False
             ).add_to(m)
 
+        # Hotspot polygons as a single GeoJSON layer
+        if hotspots is not None and len(hotspots):
+            folium.GeoJson(
+                hotspots.to_json(),
+                name='Hotspots',
+                style_function=lambda feature: {
+                    'color': 'darkred', 'weight': 2, 'fillColor': 'red', 'fillOpacity': 0.15
+                },
+                tooltip=folium.GeoJsonTooltip(
+                    fields=['cluster_id', 'num_points', 'total_weight'],
+                    aliases=['Hotspot', 'Points', 'Total Weight']
+                )
+            ).add_to(m)
+            folium.LayerControl().add_to(m)
+
         # Add legend
         legend_html = '''
         <div style="position: fixed;
@@ -289,18 +386,31 @@ class HackathonHomelessModel:
 
         return m
 
-    def create_analysis_charts(self, df, priority_areas, feature_importance):
+    def create_analysis_charts(self, df, priority_areas, feature_importance, large_data=None, max_points=5000):
         """
         Create analysis charts for presentation
+        large_data pre-aggregates histograms/box plots and uses WebGL scatter traces,
+        so figure size stays bounded (defaults to on above LARGE_DATA_THRESHOLD rows)
         """
+        if large_data is None:
+            large_data = len(df) > LARGE_DATA_THRESHOLD
+
         # 1. Need Score Distribution
-        fig1 = px.histogram(df, x='need_score', nbins=15,
-                           title='Distribution of Service Need Scores Across San Diego County')
+        if large_data:
+            fig1 = go.Figure(binned_histogram(df['need_score'], nbins=15))
+            fig1.update_layout(title='Distribution of Service Need Scores Across San Diego County', bargap=0)
+        else:
+            fig1 = px.histogram(df, x='need_score', nbins=15,
+                               title='Distribution of Service Need Scores Across San Diego County')
         fig1.update_layout(xaxis_title='Need Score', yaxis_title='Number of Areas')
 
         # 2. Service Gap by Region
-        fig2 = px.box(df, x='region', y='capacity_gap',
-                     title='Service Capacity Gap by Region')
+        if large_data:
+            fig2 = go.Figure(precomputed_box(df, 'region', 'capacity_gap'))
+            fig2.update_layout(title='Service Capacity Gap by Region')
+        else:
+            fig2 = px.box(df, x='region', y='capacity_gap',
+                         title='Service Capacity Gap by Region')
         fig2.update_layout(xaxis_title='Region', yaxis_title='Capacity Gap (People)')
 
         # 3. Feature Importance
@@ -309,9 +419,21 @@ class HackathonHomelessModel:
         fig3.update_layout(xaxis_title='Importance Score', yaxis_title='Feature')
 
         # 4. Priority Areas Analysis
-        fig4 = px.scatter(priority_areas, x='homeless_count', y='need_score',
-                         size='capacity_gap', color='region',
-                         title='Priority Areas: Homeless Count vs Need Score')
+        if large_data:
+            points = downsample(priority_areas, max_points)
+            sizes = points['capacity_gap'].clip(lower=0)
+            sizeref = 2.0 * max(sizes.max(), 1) / 40 ** 2
+            fig4 = go.Figure()
+            for region, group in points.groupby('region'):
+                fig4.add_trace(go.Scattergl(
+                    x=group['homeless_count'], y=group['need_score'], mode='markers', name=region,
+                    marker=dict(size=sizes.loc[group.index], sizemode='area', sizeref=sizeref, sizemin=2)
+                ))
+            fig4.update_layout(title='Priority Areas: Homeless Count vs Need Score')
+        else:
+            fig4 = px.scatter(priority_areas, x='homeless_count', y='need_score',
+                             size='capacity_gap', color='region',
+                             title='Priority Areas: Homeless Count vs Need Score')
         fig4.update_layout(xaxis_title='Homeless Count', yaxis_title='Need Score')
 
         return fig1, fig2, fig3, fig4
@@ -349,9 +471,10 @@ class HackathonHomelessModel:
 
         return summary
 
-def run_hackathon_demo():
+def run_hackathon_demo(zip_aggregates=None):
     """
     Main function to run the complete analysis
+    (zip_aggregates from spatial_join.build_zip_aggregates replace the mock service counts)
     """
     print("🚀 Starting San Diego Homeless Services Gap Analysis...")
 
@@ -361,6 +484,8 @@ def run_hackathon_demo():
     # Generate and prepare data
     print("📊 Generating data...")
     df = model.generate_mock_data()
+    if zip_aggregates is not None:
+        df = model.apply_zip_aggregates(df, zip_aggregates)
     df = model.calculate_service_gaps(df)
 
     # Train predictive model
@@ -371,13 +496,19 @@ def run_hackathon_demo():
     print("🎯 Identifying priority areas...")
     priority_areas = model.identify_priority_areas(df)
 
+    # How stable is the priority list under input uncertainty?
+    from uncertainty import need_score_uncertainty
+    uncertainty = need_score_uncertainty(df, top_n=len(priority_areas))
+
     # Generate recommendations
     print("💡 Generating recommendations...")
     recommendations = model.recommend_interventions(priority_areas, df)
 
     # Create visualizations
     print("📈 Creating visualizations...")
-    map_viz = model.create_dashboard_map(df, priority_areas)
+    from hotspots import hotspot_analysis
+    hotspots = hotspot_analysis(df, weight_col='capacity_gap', eps_km=3.0, min_weight=100)
+    map_viz = model.create_dashboard_map(df, priority_areas, hotspots)
     charts = model.create_analysis_charts(df, priority_areas, feature_importance)
 
     # Generate summary
@@ -391,12 +522,18 @@ def run_hackathon_demo():
     map_viz.save('san_diego_homeless_services_map.html')
     print("\n📍 Interactive map saved as 'san_diego_homeless_services_map.html'")
 
+    # Render charts and summary into a shareable report
+    from report_builder import build_report
+    build_report(charts, summary)
+
     return {
         'model': model,
         'data': df,
         'priority_areas': priority_areas,
+        'uncertainty': uncertainty,
         'recommendations': recommendations,
         'map': map_viz,
+        'hotspots': hotspots,
         'charts': charts,
         'summary': summary
     }
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Compact Table
+Memory-compact layout of the services table with descriptions moved to a
+lazily read on-disk store
+"""
+
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import pandas as pd
+import numpy as np
+from improved_services_map import SERVICE_CONFIG
+
+DESCRIPTION_STORE_PATH = '../cache/descriptions'
+
+# Older store versions kept for workers that may still be reading them: the most
+# recent STORE_VERSIONS_KEPT, and any written within STORE_GRACE_PERIOD seconds
+STORE_VERSIONS_KEPT = 3
+STORE_GRACE_PERIOD = 24 * 3600
+
+STRING_COLUMNS = ['name', 'address', 'phone', 'website']
+
+
+def string_dtype():
+    """Arrow-backed strings when pyarrow is installed, otherwise interned Python strings"""
+    try:
+        import pyarrow  # noqa: F401
+        return 'string[pyarrow]'
+    except ImportError:
+        return None
+
+
+class DescriptionStore:
+    """
+    Service descriptions in one UTF-8 file plus an offsets array.
+    Nothing is read until a description is requested, and the OS page cache
+    is shared by every worker that opens the same store. Each store lives in
+    its own version directory that is never modified after it is published.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._offsets = None
+        self._data = None
+        # Map the files now, so a handle keeps working if its version is pruned later
+        self._open()
+
+    def __getstate__(self):
+        # Worker processes map the files themselves instead of receiving copies
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    @classmethod
+    def write(cls, descriptions, path=DESCRIPTION_STORE_PATH):
+        """
+        Write descriptions in order; description i is fetched with store.get(i).
+        Files are written to a temporary directory and renamed to a directory named
+        after their content, so files other workers have mapped are never truncated.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        encoded = [(d if isinstance(d, str) else '').encode('utf-8') for d in descriptions]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        data = b''.join(encoded)
+
+        version = hashlib.sha256(offsets.tobytes() + data).hexdigest()[:16]
+        version_path = os.path.join(path, version)
+
+        if not os.path.exists(version_path):
+            tmp_path = tempfile.mkdtemp(prefix=f'.{version}-', dir=path)
+            with open(os.path.join(tmp_path, 'descriptions.bin'), 'wb') as f:
+                f.write(data)
+            np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+            try:
+                os.replace(tmp_path, version_path)
+            except OSError:
+                # Another writer published the same version first
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+        os.utime(version_path)
+        prune_store_versions(path)
+        return cls(version_path)
+
+    def _open(self):
+        if self._offsets is None:
+            self._offsets = np.load(os.path.join(self.path, 'offsets.npy'), mmap_mode='r')
+            data_path = os.path.join(self.path, 'descriptions.bin')
+            self._data = np.memmap(data_path, dtype=np.uint8, mode='r') if os.path.getsize(data_path) else np.zeros(0, np.uint8)
+
+    def __len__(self):
+        self._open()
+        return len(self._offsets) - 1
+
+    def get(self, description_id):
+        """Description for one record ('' when missing)"""
+        if description_id is None or pd.isna(description_id) or description_id < 0:
+            return ''
+        self._open()
+        start, end = self._offsets[description_id], self._offsets[description_id + 1]
+        return self._data[start:end].tobytes().decode('utf-8')
+
+    def search(self, text):
+        """Description ids whose text contains the given string (case-insensitive)"""
+        self._open()
+        text = text.lower()
+        return [i for i in range(len(self)) if text in self.get(i).lower()]
+
+
+def prune_store_versions(path=DESCRIPTION_STORE_PATH, keep=STORE_VERSIONS_KEPT, grace_period=STORE_GRACE_PERIOD):
+    """Remove description store versions beyond the newest `keep` that are older than the grace period"""
+    versions = [os.path.join(path, name) for name in os.listdir(path) if not name.startswith('.')]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    cutoff = time.time() - grace_period
+    for version_path in versions[keep:]:
+        # Open handles keep their mapped files readable after the directory is removed
+        if os.path.getmtime(version_path) < cutoff:
+            shutil.rmtree(version_path, ignore_errors=True)
+
+
+def compact_services_table(services_df, store_path=DESCRIPTION_STORE_PATH):
+    """
+    Return (compact_df, description_store): categorical service_type and zip_code,
+    an integer zip column, arrow-backed or interned strings, float32 coordinates
+    and a description_id in place of the description text
+    """
+    compact = pd.DataFrame(index=services_df.index)
+
+    dtype = string_dtype()
+    for column in STRING_COLUMNS:
+        if column in services_df:
+            values = services_df[column].where(services_df[column].notna(), None)
+            if dtype:
+                compact[column] = values.astype(dtype)
+            else:
+                compact[column] = values.map(lambda v: sys.intern(v) if isinstance(v, str) else v)
+
+    types = list(SERVICE_CONFIG.keys())
+    types += sorted(set(services_df['service_type'].dropna()) - set(types))
+    compact['service_type'] = pd.Categorical(services_df['service_type'], categories=types)
+
+    compact['zip_code'] = services_df['zip_code'].astype('category')
+    compact['zip_int'] = pd.to_numeric(services_df['zip_code'], errors='coerce').fillna(0).astype(np.int32)
+
+    for column in ['latitude', 'longitude']:
+        if column in services_df:
+            compact[column] = services_df[column].astype(np.float32)
+
+    # Any other columns (spatial_zip, record_key, duplicate_count, ...) are carried over
+    for column in services_df.columns:
+        if column not in compact and column != 'description':
+            compact[column] = services_df[column]
+
+    descriptions = None
+    if 'description' in services_df:
+        descriptions = DescriptionStore.write(services_df['description'].tolist(), store_path)
+        compact['description_id'] = np.arange(len(services_df), dtype=np.int32)
+
+    before = services_df.memory_usage(deep=True).sum()
+    after = compact.memory_usage(deep=True).sum()
+    print(f"Compacted services table: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+
+    return compact, descriptions
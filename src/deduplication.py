@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Deduplication
+Merges near-duplicate directory records using zip/phone/address blocking and
+MinHash LSH on character n-grams of names, verified on name and address separately
+"""
+
+import re
+import zlib
+import pandas as pd
+import numpy as np
+
+# Largest prime below 2**32: with a, b, x < HASH_PRIME, a * x + b stays below 2**64
+HASH_PRIME = 4294967291
+
+# Records per MinHash chunk, bounding the (num_perm x shingles) working array
+MINHASH_CHUNK_SIZE = 2048
+
+
+# Abbreviations expanded before names are compared
+NAME_ABBREVIATIONS = {'ctr': 'center', 'cntr': 'center', 'svc': 'service', 'svcs': 'services', 'intl': 'international'}
+
+# Words that do not distinguish two programs
+NAME_STOPWORDS = {'the', 'inc', 'llc', 'of', 'and'}
+
+
+def normalize_text(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    if not isinstance(text, str):
+        return ''
+    text = re.sub(r'[^a-z0-9 ]', ' ', text.lower().replace("'", '').replace('&', ' and '))
+    return ' '.join(NAME_ABBREVIATIONS.get(word, word) for word in text.split())
+
+
+def normalize_phone(phone):
+    """Keep the last 10 digits of a phone number"""
+    if not isinstance(phone, str):
+        return ''
+    return re.sub(r'\D', '', phone)[-10:]
+
+
+def shingle_hashes(text, n=3):
+    """32-bit hashes of the character n-grams of a string"""
+    if len(text) < n:
+        text = text.ljust(n)
+    return np.array(sorted({zlib.crc32(text[i:i + n].encode('utf-8')) for i in range(len(text) - n + 1)}),
+                    dtype=np.uint64)
+
+
+def minhash_signatures(texts, num_perm=64, n=3, seed=42, chunk_size=MINHASH_CHUNK_SIZE):
+    """
+    MinHash signatures for a list of strings as a (len(texts), num_perm) uint32 array.
+    Each chunk of records is hashed in one vectorized pass over its shingles.
+    """
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, HASH_PRIME, size=num_perm, dtype=np.int64).astype(np.uint64)
+    b = rng.randint(0, HASH_PRIME, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint32)
+
+    for start in range(0, len(texts), chunk_size):
+        shingles = [shingle_hashes(t, n) % np.uint64(HASH_PRIME) for t in texts[start:start + chunk_size]]
+        lengths = np.array([len(s) for s in shingles])
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+        # (num_perm, chunk shingles) permuted hashes; min per record via reduceat
+        permuted = (np.outer(a, np.concatenate(shingles)) + b[:, None]) % np.uint64(HASH_PRIME)
+        signatures[start:start + len(shingles)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+
+    return signatures
+
+
+def shingle_set(text, n=3):
+    """Set of the character n-grams of a string"""
+    if len(text) < n:
+        text = text.ljust(n)
+    return frozenset(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two shingle sets"""
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def name_similarity(name_a, name_b, shingles_a, shingles_b):
+    """
+    Similarity of two normalized names: the lower of the whole-name Jaccard and
+    the Jaccard of the words the names do not share. A long shared prefix such as
+    an organization name then cannot hide different program words
+    ("... Day Center" vs "... Health Center").
+    """
+    whole = jaccard(shingles_a, shingles_b)
+    words_a, words_b = set(name_a.split()), set(name_b.split())
+    rest_a = ' '.join(sorted(words_a - words_b - NAME_STOPWORDS))
+    rest_b = ' '.join(sorted(words_b - words_a - NAME_STOPWORDS))
+
+    if rest_a == rest_b:
+        return whole
+    if not rest_a or not rest_b:
+        return 0.0
+    return min(whole, jaccard(shingle_set(rest_a), shingle_set(rest_b)))
+
+
+def lsh_candidate_pairs(signatures, block_keys, bands=16, window=16):
+    """
+    Candidate pairs (as an (m, 2) array) that share a block key and at least one
+    LSH band bucket. Members of a bucket are paired with their next `window`
+    neighbours, so small buckets get all pairs and large ones stay linear.
+    """
+    num_records, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs = []
+
+    block_codes = pd.factorize(pd.Series(block_keys))[0]
+    in_block = np.flatnonzero(block_codes >= 0)
+
+    for band in range(bands):
+        band_slice = np.ascontiguousarray(signatures[in_block, band * rows:(band + 1) * rows])
+        band_hash = band_slice.view(np.dtype((np.void, band_slice.dtype.itemsize * rows))).ravel()
+        bucket = block_codes[in_block].astype(np.int64) * (num_records + 1) + pd.factorize(band_hash)[0]
+
+        order = np.argsort(bucket, kind='stable')
+        members, bucket = in_block[order], bucket[order]
+        for offset in range(1, window + 1):
+            same = bucket[offset:] == bucket[:-offset]
+            pairs.append(np.column_stack([members[:-offset][same], members[offset:][same]]))
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    return unique_pairs(pairs, num_records)
+
+
+def unique_pairs(pairs, num_records):
+    """Distinct (low, high) index pairs, deduplicated as single int64 keys"""
+    keys = np.unique(pairs.min(axis=1).astype(np.int64) * num_records + pairs.max(axis=1))
+    return np.column_stack([keys // num_records, keys % num_records])
+
+
+def cluster_duplicates(num_records, pairs):
+    """Union-find over matched pairs; returns a cluster id per record"""
+    parent = np.arange(num_records)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    return np.array([find(i) for i in range(num_records)])
+
+
+def deduplicate_services(services_df, name_threshold=0.6, address_threshold=0.6, num_perm=64, bands=16):
+    """
+    Merge near-duplicate service records.
+    Candidates share a zip code, phone or exact address and a MinHash LSH bucket
+    on the name. A pair is merged only when both records have the same service
+    type, their names are similar and their addresses match (same address or
+    phone, or similar address text) - a shared building alone is not enough.
+    """
+    print("Deduplicating services...")
+
+    if len(services_df) == 0:
+        return services_df
+
+    df = services_df.reset_index(drop=True)
+
+    names = df['name'].map(normalize_text)
+    addresses = df['address'].map(normalize_text)
+    phones = df['phone'].map(normalize_phone)
+
+    signatures = minhash_signatures(names.tolist(), num_perm=num_perm)
+    address_signatures = minhash_signatures(addresses.tolist(), num_perm=num_perm)
+
+    # Blocks: missing keys (NaN) never match anything
+    blocks = [
+        df['zip_code'].where(df['zip_code'].notna(), np.nan),
+        phones.replace('', np.nan),
+        addresses.replace('', np.nan),
+    ]
+    pairs = unique_pairs(np.concatenate([lsh_candidate_pairs(signatures, block_keys.tolist(), bands)
+                                         for block_keys in blocks]), len(df))
+
+    # Vectorized filter before the exact checks: same service type, a place match
+    # (same address or phone, or a similar address estimate) and a similar name estimate
+    service_types = pd.factorize(df['service_type'])[0]
+    address_codes = pd.factorize(addresses.replace('', np.nan))[0]
+    phone_codes = pd.factorize(phones.replace('', np.nan))[0]
+    left, right = pairs[:, 0], pairs[:, 1]
+
+    same_place = (((address_codes[left] >= 0) & (address_codes[left] == address_codes[right])) |
+                  ((phone_codes[left] >= 0) & (phone_codes[left] == phone_codes[right])))
+    address_estimate = (address_signatures[left] == address_signatures[right]).mean(axis=1)
+    name_estimate = (signatures[left] == signatures[right]).mean(axis=1)
+
+    keep = ((service_types[left] == service_types[right]) &
+            (name_estimate >= name_threshold - 0.2) &
+            (same_place | (address_estimate >= address_threshold - 0.2)))
+    pairs, same_place = pairs[keep], same_place[keep]
+
+    names = names.to_numpy()
+    name_shingles = {i: shingle_set(names[i]) for i in np.unique(pairs)}
+    address_shingles = {i: shingle_set(addresses.iat[i]) for i in np.unique(pairs[~same_place])}
+
+    def is_duplicate(i, j, same_place):
+        if name_similarity(names[i], names[j], name_shingles[i], name_shingles[j]) < name_threshold:
+            return False
+        return same_place or jaccard(address_shingles[i], address_shingles[j]) >= address_threshold
+
+    matched = [(i, j) for (i, j), place in zip(pairs.tolist(), same_place.tolist()) if is_duplicate(i, j, place)]
+    df['cluster_id'] = cluster_duplicates(len(df), matched)
+
+    # Keep the most complete record of each cluster
+    completeness = df[['phone', 'website', 'description']].fillna('').astype(str).apply(lambda c: c.str.len()).sum(axis=1)
+    df['duplicate_count'] = df.groupby('cluster_id')['cluster_id'].transform('size')
+    keep = completeness.groupby(df['cluster_id']).idxmax()
+    deduped = df.loc[keep.sort_values()].drop(columns='cluster_id').reset_index(drop=True)
+
+    print(f"Merged {len(df) - len(deduped)} duplicate records ({len(deduped)} unique services)")
+    return deduped
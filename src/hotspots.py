@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Hotspot Analysis
+Server-side clustering of service or need locations with mini-batch K-means and
+grid-accelerated density clustering, returned as cluster polygons with statistics
+"""
+
+import os
+import pandas as pd
+import numpy as np
+import geopandas as gpd
+import shapely
+from concurrent.futures import ThreadPoolExecutor
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.cluster import MiniBatchKMeans
+from threadpoolctl import threadpool_limits
+
+EARTH_RADIUS_KM = 6371.0
+
+# Points per worker chunk in the grid density pass
+POINT_CHUNK_SIZE = 250_000
+
+# The cell itself and its 8 neighbours as (dx, dy) offsets
+NEIGHBOUR_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def project_km(lats, lons):
+    """Local equirectangular projection to kilometers (accurate at county scale)"""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    lat0 = np.radians(np.nanmean(lats))
+    x = np.radians(lons) * EARTH_RADIUS_KM * np.cos(lat0)
+    y = np.radians(lats) * EARTH_RADIUS_KM
+    return np.column_stack([x, y])
+
+
+def resolve_n_jobs(n_jobs=None):
+    """Number of workers to use; None or -1 means all cores"""
+    if n_jobs is None or n_jobs < 1:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def minibatch_kmeans_labels(xy, weights, n_clusters=10, batch_size=4096, seed=42, n_jobs=None):
+    """
+    Weighted mini-batch K-means cluster label per point.
+    scikit-learn runs each mini-batch step on n_jobs OpenMP threads, which only
+    keeps every thread busy with at least 256 points per thread in a batch.
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    n_clusters = min(n_clusters, len(xy))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=max(batch_size, 256 * n_jobs),
+                             random_state=seed, n_init=3)
+    with threadpool_limits(limits=n_jobs, user_api='openmp'):
+        return kmeans.fit_predict(xy, sample_weight=weights)
+
+
+def grid_density_labels(xy, weights, eps_km=1.0, min_weight=5.0, n_jobs=None):
+    """
+    DBSCAN-like clustering on a grid of eps-sized cells: a cell is dense when the
+    weight in it and its 8 neighbours reaches min_weight, and touching dense cells
+    form one cluster. Only occupied cells are stored (sorted int64 cell keys), so
+    memory follows the number of points rather than the bounding box. Points are
+    binned in chunks on n_jobs threads. Points outside dense cells get -1.
+    """
+    cells = np.floor((xy - xy.min(axis=0)) / eps_km).astype(np.int64) + 1
+    height = cells[:, 1].max() + 2
+    point_keys = cells[:, 0] * height + cells[:, 1]
+
+    chunks = [slice(start, start + POINT_CHUNK_SIZE) for start in range(0, len(xy), POINT_CHUNK_SIZE)]
+
+    def bin_chunk(chunk):
+        keys, inverse = np.unique(point_keys[chunk], return_inverse=True)
+        return keys, np.bincount(inverse, weights=weights[chunk], minlength=len(keys))
+
+    # Per-chunk cell weights, merged into one sorted array of occupied cells
+    with ThreadPoolExecutor(max_workers=resolve_n_jobs(n_jobs)) as executor:
+        binned = list(executor.map(bin_chunk, chunks))
+    keys, inverse = np.unique(np.concatenate([k for k, _ in binned]), return_inverse=True)
+    cell_weight = np.bincount(inverse, weights=np.concatenate([w for _, w in binned]), minlength=len(keys))
+
+    def neighbour_positions(dx, dy):
+        """Index of each cell's (dx, dy) neighbour in keys, or -1 when it is empty"""
+        neighbour = keys + (dx * height + dy)
+        positions = np.minimum(np.searchsorted(keys, neighbour), len(keys) - 1)
+        return np.where(keys[positions] == neighbour, positions, -1)
+
+    neighbours = [neighbour_positions(dx, dy) for dx, dy in NEIGHBOUR_OFFSETS]
+
+    neighbourhood = np.zeros(len(keys))
+    for positions in neighbours:
+        found = positions >= 0
+        neighbourhood[found] += cell_weight[positions[found]]
+    dense = neighbourhood >= min_weight
+
+    # Touching dense cells are connected components of the dense-cell graph
+    sources, targets = [], []
+    for positions in neighbours:
+        linked = dense & (positions >= 0)
+        linked[linked] = dense[positions[linked]]
+        sources.append(np.flatnonzero(linked))
+        targets.append(positions[linked])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8), (sources, targets)), shape=(len(keys), len(keys)))
+    _, components = connected_components(graph, directed=False)
+
+    # Number clusters 0..k-1 over dense cells only
+    cell_labels = np.full(len(keys), -1, dtype=np.int64)
+    cell_labels[dense] = np.unique(components[dense], return_inverse=True)[1]
+
+    def label_chunk(chunk):
+        return cell_labels[np.searchsorted(keys, point_keys[chunk])]
+
+    with ThreadPoolExecutor(max_workers=resolve_n_jobs(n_jobs)) as executor:
+        return np.concatenate(list(executor.map(label_chunk, chunks)))
+
+
+def hotspot_analysis(df, weight_col=None, method='density', lat_col='lat', lon_col='lon',
+                     eps_km=1.0, min_weight=5.0, n_clusters=10, buffer_km=0.3, n_jobs=None):
+    """
+    Cluster point locations weighted by need or capacity gap.
+    method is 'density' (grid DBSCAN-like) or 'kmeans' (mini-batch K-means);
+    both use n_jobs cores (all cores by default).
+    Returns a GeoDataFrame with one convex-hull polygon and its statistics per cluster.
+    """
+    print(f"Finding hotspots ({method})...")
+
+    points = df[df[lat_col].notna() & df[lon_col].notna()]
+    lats = points[lat_col].to_numpy(dtype=float)
+    lons = points[lon_col].to_numpy(dtype=float)
+
+    if weight_col is None:
+        weights = np.ones(len(points))
+    else:
+        weights = points[weight_col].to_numpy(dtype=float).clip(min=0)
+
+    columns = ['cluster_id', 'num_points', 'total_weight', 'center_lat', 'center_lon', 'geometry']
+    if len(points) == 0:
+        return gpd.GeoDataFrame(columns=columns, geometry='geometry', crs='EPSG:4326')
+
+    xy = project_km(lats, lons)
+    if method == 'kmeans':
+        labels = minibatch_kmeans_labels(xy, weights, n_clusters, n_jobs=n_jobs)
+    elif method == 'density':
+        labels = grid_density_labels(xy, weights, eps_km, min_weight, n_jobs=n_jobs)
+    else:
+        raise ValueError(f"Unknown hotspot method: {method}")
+
+    clustered = pd.DataFrame({'cluster_id': labels, 'lat': lats, 'lon': lons, 'weight': weights})
+    clustered = clustered[clustered['cluster_id'] >= 0]
+
+    stats = clustered.groupby('cluster_id').agg(
+        num_points=('weight', 'size'),
+        total_weight=('weight', 'sum'),
+        center_lat=('lat', 'mean'),
+        center_lon=('lon', 'mean')
+    )
+
+    # Convex hull of each cluster, buffered so 1-2 point clusters still have an area
+    buffer_deg = buffer_km / (np.radians(1) * EARTH_RADIUS_KM)
+    order = np.argsort(clustered['cluster_id'].to_numpy(), kind='stable')
+    ids = clustered['cluster_id'].to_numpy()[order]
+    coords = shapely.points(clustered['lon'].to_numpy()[order], clustered['lat'].to_numpy()[order])
+    hulls = shapely.convex_hull(shapely.multipoints(coords, indices=np.searchsorted(np.unique(ids), ids)))
+    stats['geometry'] = shapely.buffer(hulls, buffer_deg)
+
+    hotspots = gpd.GeoDataFrame(stats.reset_index(), geometry='geometry', crs='EPSG:4326')
+    hotspots = hotspots.sort_values('total_weight', ascending=False).reset_index(drop=True)
+
+    print(f"Found {len(hotspots)} hotspots covering {int(hotspots['num_points'].sum())} of {len(points)} points")
+    return hotspots[columns]
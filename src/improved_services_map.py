@@ -9,7 +9,9 @@ import numpy as np
 import folium
 import json
 import re
+import hashlib
 from folium import plugins
+from branca.element import Element
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -27,19 +29,63 @@ def load_homeless_services_data():
         print(f"Error loading homeless services data: {e}")
         return None
 
+# Link text the 2-1-1 export appends to addresses ("... CA 92028Confidential:Get Directions")
+ADDRESS_NOTE_PATTERN = re.compile(r'(?:\s*(?:Confidential:?|Get Directions))+\s*$', re.IGNORECASE)
+# Trailing California zip code (90000-96199), optionally followed by +4 and country
+TRAILING_ZIP_PATTERN = re.compile(r'(?<!\d)(9[0-6]\d{3})(?:-\d{4})?[\s,.]*(?:USA|United States)?[\s,.]*$', re.IGNORECASE)
+# Zip code following the state, for addresses with other text run on after the zip
+STATE_ZIP_PATTERN = re.compile(r'\bCA\.?,?\s*(9[0-6]\d{3})(?!\d)', re.IGNORECASE)
+
+# Unit designators rewritten to one format. The designator must be a whole word
+# followed by a unit number (or a single letter), so "Stevens", "Unity", "Aptos"
+# and "United States" are left alone
+UNIT_VALUE = r'(\d+[a-z]?|[a-z]\d*)\b'
+UNIT_PATTERNS = [
+    (r'\b(?:suite|ste)\b\.?\s*#?\s*' + UNIT_VALUE, r'Suite \1'),
+    (r'\b(?:apartment|apt)\b\.?\s*#?\s*' + UNIT_VALUE, r'Apt \1'),
+    (r'\bunit\b\.?\s*#?\s*' + UNIT_VALUE, r'Unit \1'),
+    (r'#\s+(\w+)', r'#\1'),
+]
+
+def normalize_addresses(addresses):
+    """
+    Clean an address column and extract trailing CA zip codes in one pass.
+    Each distinct address is normalized once and mapped back to all rows that share it.
+    Returns (clean_addresses, zip_codes) as Series aligned with the input.
+    """
+    addresses = pd.Series(addresses, dtype=object)
+    codes, uniques = pd.factorize(addresses)
+    uniques = pd.Series(uniques, dtype=object)
+
+    # Normalize whitespace (newlines, non-breaking spaces, repeated spaces)
+    clean = uniques.str.replace(r'[\s\u00a0]+', ' ', regex=True).str.strip()
+    clean = clean.str.replace(r'\s+,', ',', regex=True)
+    clean = clean.str.replace(ADDRESS_NOTE_PATTERN, '', regex=True)
+    for pattern, replacement in UNIT_PATTERNS:
+        clean = clean.str.replace(pattern, replacement, regex=True, case=False)
+
+    zip_codes = clean.str.extract(TRAILING_ZIP_PATTERN, expand=False)
+    zip_codes = zip_codes.fillna(clean.str.extract(STATE_ZIP_PATTERN, expand=False))
+
+    # Empty addresses behave like parse_address: no address, no zip
+    empty = clean.fillna('') == ''
+    clean[empty] = None
+    zip_codes[empty | zip_codes.isna()] = None
+
+    # Missing addresses get code -1; append a None slot for them
+    clean = pd.concat([clean, pd.Series([None], dtype=object)], ignore_index=True).to_numpy()
+    zip_codes = pd.concat([zip_codes, pd.Series([None], dtype=object)], ignore_index=True).to_numpy()
+
+    return (pd.Series(clean[codes], index=addresses.index, dtype=object),
+            pd.Series(zip_codes[codes], index=addresses.index, dtype=object))
+
 def parse_address(address_str):
     """Parse address string to extract zip code and clean address"""
     if not address_str:
         return None, None
     
-    # Extract zip code (5 digits)
-    zip_match = re.search(r'(\d{5})', address_str)
-    zip_code = zip_match.group(1) if zip_match else None
-    
-    # Clean address (remove \n and extra spaces)
-    clean_address = address_str.replace('\n', ' ').replace('\u00a0', ' ').strip()
-    
-    return clean_address, zip_code
+    clean_address, zip_code = normalize_addresses([address_str])
+    return clean_address.iloc[0], zip_code.iloc[0]
 
 def extract_service_info(service_data):
     """Extract key information from service data with better categorization"""
@@ -54,8 +100,9 @@ def extract_service_info(service_data):
             website = service.get('website', '')
             description = service.get('description', '')
             
-            # Parse address
-            clean_address, zip_code = parse_address(address)
+            # Per-record coordinates from the 2-1-1 export (strings, may be null)
+            latitude = service.get('Latitude', service.get('latitude'))
+            longitude = service.get('Longitude', service.get('longitude'))
             
             # Enhanced service type classification
             service_type = 'Other'
@@ -82,19 +129,30 @@ def extract_service_info(service_data):
             
             services.append({
                 'name': name,
-                'address': clean_address,
-                'zip_code': zip_code,
+                'address': address,
                 'phone': phone,
                 'website': website,
                 'description': description,
-                'service_type': service_type
+                'service_type': service_type,
+                'source_latitude': latitude,
+                'source_longitude': longitude
             })
             
         except Exception as e:
             print(f"Error processing service: {e}")
             continue
     
-    return pd.DataFrame(services)
+    services_df = pd.DataFrame(services, columns=['name', 'address', 'phone', 'website', 'description', 'service_type',
+                                                  'source_latitude', 'source_longitude'])
+    for column in ['source_latitude', 'source_longitude']:
+        services_df[column] = pd.to_numeric(services_df[column], errors='coerce')
+    
+    # Parse all addresses in one batch
+    clean_addresses, zip_codes = normalize_addresses(services_df['address'])
+    services_df['address'] = clean_addresses
+    services_df.insert(2, 'zip_code', zip_codes)
+    
+    return services_df
 
 def get_san_diego_coordinates():
     """Get more accurate coordinates for San Diego zip codes"""
@@ -147,7 +205,11 @@ def get_san_diego_coordinates():
     return zip_coords
 
 def add_coordinates_to_services(services_df):
-    """Add geographic coordinates to services dataframe"""
+    """
+    Add geographic coordinates to services dataframe.
+    Records with their own Latitude/Longitude keep them (has_location=True); the
+    rest are placed near their address zip code, which carries no real geography.
+    """
     print("Adding geographic coordinates...")
     
     zip_coords = get_san_diego_coordinates()
@@ -160,85 +222,74 @@ def add_coordinates_to_services(services_df):
     services_df['latitude'] += np.random.normal(0, 0.005, len(services_df))
     services_df['longitude'] += np.random.normal(0, 0.005, len(services_df))
     
+    # Prefer the coordinates that came with the record
+    source_lat = services_df.get('source_latitude', pd.Series(np.nan, index=services_df.index))
+    source_lon = services_df.get('source_longitude', pd.Series(np.nan, index=services_df.index))
+    services_df['has_location'] = (source_lat.notna() & source_lon.notna()).to_numpy()
+    services_df.loc[services_df['has_location'], 'latitude'] = source_lat[services_df['has_location']]
+    services_df.loc[services_df['has_location'], 'longitude'] = source_lon[services_df['has_location']]
+    services_df = services_df.drop(columns=['source_latitude', 'source_longitude'], errors='ignore')
+    
+    print(f"{services_df['has_location'].sum()} of {len(services_df)} services have record coordinates")
     return services_df
 
-def create_enhanced_services_map(services_df):
-    """Create an enhanced interactive map of homeless services"""
-    print("\nCreating enhanced interactive services map...")
-    
-    # Create map centered on San Diego with multiple tile layers
-    m = folium.Map(
-        location=[32.7157, -117.1611], 
-        zoom_start=11, 
-        tiles='OpenStreetMap',
-        control_scale=True
-    )
-    
-    # Add multiple tile layers for different views
-    folium.TileLayer('cartodbpositron', name='Light Map').add_to(m)
-    folium.TileLayer('cartodbdark_matter', name='Dark Map').add_to(m)
-    folium.TileLayer('Stamen Terrain', name='Terrain', attribution='Map tiles by Stamen Design, CC BY 3.0 — Map data © OpenStreetMap contributors').add_to(m)
-    
-    # Enhanced color scheme and icons for different service types
-    service_config = {
-        'Shelter/Housing': {
-            'color': 'red',
-            'icon': 'home',
-            'prefix': 'fa'
-        },
-        'Food Services': {
-            'color': 'orange',
-            'icon': 'cutlery',
-            'prefix': 'fa'
-        },
-        'Medical/Health': {
-            'color': 'blue',
-            'icon': 'plus',
-            'prefix': 'fa'
-        },
-        'Mental Health': {
-            'color': 'purple',
-            'icon': 'heart',
-            'prefix': 'fa'
-        },
-        'Employment': {
-            'color': 'green',
-            'icon': 'briefcase',
-            'prefix': 'fa'
-        },
-        'Basic Needs': {
-            'color': 'brown',
-            'icon': 'shower',
-            'prefix': 'fa'
-        },
-        'Legal/Advocacy': {
-            'color': 'darkblue',
-            'icon': 'gavel',
-            'prefix': 'fa'
-        },
-        'Youth/Family': {
-            'color': 'pink',
-            'icon': 'child',
-            'prefix': 'fa'
-        },
-        'Other': {
-            'color': 'gray',
-            'icon': 'info-circle',
-            'prefix': 'fa'
-        }
+# Enhanced color scheme and icons for different service types
+SERVICE_CONFIG = {
+    'Shelter/Housing': {
+        'color': 'red',
+        'icon': 'home',
+        'prefix': 'fa'
+    },
+    'Food Services': {
+        'color': 'orange',
+        'icon': 'cutlery',
+        'prefix': 'fa'
+    },
+    'Medical/Health': {
+        'color': 'blue',
+        'icon': 'plus',
+        'prefix': 'fa'
+    },
+    'Mental Health': {
+        'color': 'purple',
+        'icon': 'heart',
+        'prefix': 'fa'
+    },
+    'Employment': {
+        'color': 'green',
+        'icon': 'briefcase',
+        'prefix': 'fa'
+    },
+    'Basic Needs': {
+        'color': 'brown',
+        'icon': 'shower',
+        'prefix': 'fa'
+    },
+    'Legal/Advocacy': {
+        'color': 'darkblue',
+        'icon': 'gavel',
+        'prefix': 'fa'
+    },
+    'Youth/Family': {
+        'color': 'pink',
+        'icon': 'child',
+        'prefix': 'fa'
+    },
+    'Other': {
+        'color': 'gray',
+        'icon': 'info-circle',
+        'prefix': 'fa'
     }
+}
+
+def build_service_layer(services_df, service_type, descriptions=None):
+    """Build the map layer of markers for a single service type (descriptions: compact_services.DescriptionStore)"""
+    config = SERVICE_CONFIG.get(service_type, SERVICE_CONFIG['Other'])
+    feature_group = folium.FeatureGroup(name=service_type)
     
-    # Create feature groups for each service type
-    feature_groups = {}
-    for service_type in service_config.keys():
-        feature_groups[service_type] = folium.FeatureGroup(name=service_type)
-    
-    # Add services to map with enhanced popups
-    for idx, row in services_df.iterrows():
+    # Add services to layer with enhanced popups
+    for idx, row in services_df[services_df['service_type'] == service_type].iterrows():
         if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-            service_type = row['service_type']
-            config = service_config.get(service_type, service_config['Other'])
-            
             # Create enhanced popup content
             popup_content = f"""
             <div style="width: 300px; font-family: Arial, sans-serif;">
@@ -255,9 +306,11 @@ def create_enhanced_services_map(services_df):
             if pd.notna(row['website']) and row['website'].strip():
                 popup_content += f"<p><strong>Website:</strong> <a href='{row['website']}' target='_blank'>Visit Website</a></p>"
             
-            if pd.notna(row['description']) and row['description'].strip():
+            # Compact tables keep descriptions in a separate store
+            description = descriptions.get(row['description_id']) if descriptions is not None else row['description']
+            if pd.notna(description) and description.strip():
                 # Truncate description if too long
-                desc = row['description'][:200] + "..." if len(row['description']) > 200 else row['description']
+                desc = description[:200] + "..." if len(description) > 200 else description
                 popup_content += f"<p><strong>Description:</strong> {desc}</p>"
             
             popup_content += "</div>"
@@ -272,10 +325,103 @@ def create_enhanced_services_map(services_df):
                     prefix=config['prefix']
                 ),
                 tooltip=f"{row['name']} ({service_type})"
-            ).add_to(feature_groups[service_type])
+            ).add_to(feature_group)
+    
+    return feature_group
+
+# Fixed id of the hidden layer indexed by the search control
+SEARCH_LAYER_ID = 'services_search'
+
+def service_layer_id(service_type):
+    """Stable layer id per service type, so cached layer scripts keep their variable names"""
+    return hashlib.md5(service_type.encode('utf-8')).hexdigest()
+
+def build_search_markers(services_df, service_type=None):
+    """Build the markers indexed by the search control (all services, or one service type)"""
+    feature_group = folium.FeatureGroup(name='Search', show=False, control=False)
+    if service_type is not None:
+        services_df = services_df[services_df['service_type'] == service_type]
+    
+    search_columns = services_df[['name', 'service_type', 'address', 'latitude', 'longitude']].dropna(subset=['latitude', 'longitude'])
+    for name, service_type, address, lat, lon in search_columns.itertuples(index=False):
+        folium.Marker(
+            location=[float(lat), float(lon)],
+            popup=f"<b>{name}</b><br>{service_type}<br>{address}",
+            icon=folium.Icon(color='red', icon='info-sign'),
+            name=name
+        ).add_to(feature_group)
+    
+    return feature_group
+
+# render_layer_fragment and CachedLayer use folium/branca internals (element _id,
+# _children and the figure's script._children), checked against folium 0.20.0 and
+# branca 0.8.2. The refresh state stores the folium version and re-renders its
+# fragments when it changes.
+def render_layer_fragment(feature_group, layer_id):
+    """Render the markers of a feature group to a script fragment that CachedLayer can replay"""
+    feature_group._id = layer_id
+    scratch_map = folium.Map()
+    feature_group.add_to(scratch_map)
+    
+    script = scratch_map.get_root().script
+    for child in feature_group._children.values():
+        child.render()
+    
+    return '\n'.join(element.render() for element in script._children.values())
+
+def build_layer_fragments(services_df, service_type, descriptions=None):
+    """Rendered marker scripts of one service type: its map layer and its search markers"""
+    return {
+        'layer': render_layer_fragment(build_service_layer(services_df, service_type, descriptions),
+                                       service_layer_id(service_type)),
+        'search': render_layer_fragment(build_search_markers(services_df, service_type), SEARCH_LAYER_ID)
+    }
+
+class CachedLayer(folium.FeatureGroup):
+    """Feature group whose markers were rendered earlier by render_layer_fragment"""
+    
+    def __init__(self, fragment, layer_id, name=None, show=True, control=True):
+        super().__init__(name=name, show=show, control=control)
+        self._id = layer_id
+        self.fragment = fragment
+    
+    def render(self, **kwargs):
+        super().render(**kwargs)
+        # The fragment is already rendered text - keep template syntax in it literal
+        self.get_root().script.add_child(Element('{% raw %}' + self.fragment + '{% endraw %}'),
+                                         name=self.get_name() + '_markers')
+
+def create_enhanced_services_map(services_df, descriptions=None, fragments=None):
+    """Create an enhanced interactive map of homeless services"""
+    print("\nCreating enhanced interactive services map...")
+    
+    # Create map centered on San Diego with multiple tile layers
+    m = folium.Map(
+        location=[32.7157, -117.1611], 
+        zoom_start=11, 
+        tiles='OpenStreetMap',
+        control_scale=True
+    )
+    
+    # Add multiple tile layers for different views
+    folium.TileLayer('cartodbpositron', name='Light Map').add_to(m)
+    folium.TileLayer('cartodbdark_matter', name='Dark Map').add_to(m)
+    folium.TileLayer('Stamen Terrain', name='Terrain', attribution='Map tiles by Stamen Design, CC BY 3.0 — Map data © OpenStreetMap contributors').add_to(m)
+    
+    # Build one layer per service type unless rendered fragments are supplied
+    # (see build_layer_fragments), in which case only the page is assembled
+    if fragments is None:
+        layers = {service_type: build_service_layer(services_df, service_type, descriptions)
+                  for service_type in SERVICE_CONFIG.keys()}
+        search_layer = build_search_markers(services_df)
+    else:
+        layers = {service_type: CachedLayer(fragment['layer'], service_layer_id(service_type), name=service_type)
+                  for service_type, fragment in fragments.items()}
+        search_layer = CachedLayer(''.join(fragment['search'] for fragment in fragments.values()),
+                                   SEARCH_LAYER_ID, name='Search', show=False, control=False)
     
     # Add all feature groups to map
-    for feature_group in feature_groups.values():
+    for feature_group in layers.values():
         feature_group.add_to(m)
     
     # Add layer control
@@ -288,20 +434,10 @@ def create_enhanced_services_map(services_df):
     minimap = plugins.MiniMap(toggle_display=True)
     m.add_child(minimap)
     
-    # Add search functionality
-    services_list = []
-    for idx, row in services_df.iterrows():
-        services_list.append({
-            'name': row['name'],
-            'type': row['service_type'],
-            'address': row['address'],
-            'lat': row['latitude'],
-            'lon': row['longitude']
-        })
-    
-    # Add search control
+    # Add search functionality over a hidden layer of all services
+    search_layer.add_to(m)
     search = plugins.Search(
-        layer=folium.FeatureGroup(),
+        layer=search_layer,
         geom_type='Point',
         placeholder='Search for services...',
         collapsed=False,
@@ -309,14 +445,6 @@ def create_enhanced_services_map(services_df):
     )
     m.add_child(search)
     
-    # Add services to search layer
-    for service in services_list:
-        folium.Marker(
-            location=[service['lat'], service['lon']],
-            popup=f"<b>{service['name']}</b><br>{service['type']}<br>{service['address']}",
-            icon=folium.Icon(color='red', icon='info-sign')
-        ).add_to(search.layer)
-    
     # Note: CSS styling is handled inline in the popup content for better compatibility
     
     # Save map
@@ -421,8 +549,11 @@ def create_service_density_heatmap(services_df):
     
     return m
 
-def generate_services_summary(services_df):
-    """Generate a summary of the services data"""
+def generate_services_summary(services_df, zip_aggregates=None):
+    """
+    Generate a summary of the services data. Per-zip counts come from zip_aggregates
+    only when every service has record coordinates; otherwise from address zip codes.
+    """
     print("\n=== HOMELESS SERVICES SUMMARY ===")
     
     total_services = len(services_df)
@@ -430,13 +561,18 @@ def generate_services_summary(services_df):
     
     # Service type breakdown
     service_counts = services_df['service_type'].value_counts()
+    service_counts = service_counts[service_counts > 0]
     print(f"\nService Type Breakdown:")
     for service_type, count in service_counts.items():
         percentage = (count / total_services) * 100
         print(f"  {service_type}: {count} ({percentage:.1f}%)")
     
     # Top areas by service count
-    zip_counts = services_df['zip_code'].value_counts().head(10)
+    located = 'has_location' in services_df and services_df['has_location'].all()
+    if zip_aggregates is not None and located:
+        zip_counts = zip_aggregates['num_services'].nlargest(10)
+    else:
+        zip_counts = services_df['zip_code'].value_counts().head(10)
     print(f"\nTop 10 Areas by Service Count:")
     for zip_code, count in zip_counts.items():
         print(f"  {zip_code}: {count} services")
@@ -463,17 +599,34 @@ def main():
     services_df = extract_service_info(services_data)
     print(f"Extracted {len(services_df)} services")
     
+    # Merge near-duplicate directory entries
+    from deduplication import deduplicate_services
+    services_df = deduplicate_services(services_df)
+    
     # Add coordinates
     services_df = add_coordinates_to_services(services_df)
     
+    # Join services with record coordinates and transit stops onto zip polygons
+    # (zip-lookup coordinates would just reproduce the address zip codes)
+    from spatial_join import load_zip_index, load_transit_stops, build_zip_aggregates
+    zip_aggregates = None
+    zip_index = load_zip_index()
+    if zip_index is not None:
+        zip_aggregates = build_zip_aggregates(zip_index, services_df=services_df[services_df['has_location']],
+                                              stops_df=load_transit_stops())
+    
     # Generate summary
-    generate_services_summary(services_df)
+    generate_services_summary(services_df, zip_aggregates)
+    
+    # Shrink the working set before building maps
+    from compact_services import compact_services_table
+    services_df, descriptions = compact_services_table(services_df)
     
     # Create different types of maps
     print("\nCreating maps...")
     
     # 1. Enhanced interactive map with icons and better popups
-    enhanced_map = create_enhanced_services_map(services_df)
+    enhanced_map = create_enhanced_services_map(services_df, descriptions=descriptions)
     
     # 2. Clustered map for better visualization of dense areas
     clustered_map = create_service_clusters_map(services_df)
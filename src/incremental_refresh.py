@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Incremental Refresh
+Detects record-level changes in the services directory and updates only the affected rows,
+per-zip aggregates and rendered map layers instead of rebuilding everything
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import folium
+import pandas as pd
+import numpy as np
+from improved_services_map import (
+    load_homeless_services_data, extract_service_info, add_coordinates_to_services,
+    build_layer_fragments, create_enhanced_services_map
+)
+from deduplication import deduplicate_services
+from spatial_join import load_zip_index
+
+REFRESH_STATE_PATH = '../cache/services_refresh_state.pkl'
+
+# What ServicesRefreshState.save persists
+STATE_ATTRIBUTES = ['hashes', 'parsed_df', 'services_df', 'zip_counts', 'fragments']
+
+
+def record_identity(record):
+    """Stable identity of a directory record: normalized name + address"""
+    name = ' '.join(str(record.get('name') or '').lower().split())
+    address = ' '.join(str(record.get('address') or '').lower().split())
+    return f"{name}|{address}"
+
+
+def record_hash(record):
+    """Content hash of a directory record"""
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def index_records(records):
+    """Map each record's key to (record, content hash); repeated identities get an occurrence suffix"""
+    indexed = {}
+    seen = {}
+
+    for record in records:
+        identity = record_identity(record)
+        occurrence = seen.get(identity, 0)
+        seen[identity] = occurrence + 1
+        key = identity if occurrence == 0 else f"{identity}#{occurrence}"
+        indexed[key] = (record, record_hash(record))
+
+    return indexed
+
+
+def diff_records(old_hashes, indexed):
+    """Compute added, removed and changed keys between stored hashes and the current records"""
+    old_keys = set(old_hashes)
+    new_keys = set(indexed)
+
+    added = new_keys - old_keys
+    removed = old_keys - new_keys
+    changed = {key for key in old_keys & new_keys if old_hashes[key] != indexed[key][1]}
+
+    return added, removed, changed
+
+
+class ServicesRefreshState:
+    """
+    Parsed and deduplicated services tables, per-record hashes, per-zip aggregates
+    and rendered map layer scripts kept between refreshes
+    """
+
+    def __init__(self, zip_index=None):
+        self.hashes = {}
+        self.parsed_df = None
+        self.services_df = None
+        self.zip_index = zip_index
+        self.zip_counts = None
+        self.fragments = {}
+
+    @classmethod
+    def load(cls, path=REFRESH_STATE_PATH, zip_index=None):
+        """Load saved state, or start empty if none exists"""
+        state = cls(zip_index)
+        if not os.path.exists(path):
+            return state
+
+        with open(path, 'rb') as f:
+            saved = pickle.load(f)
+
+        for attribute in STATE_ATTRIBUTES:
+            setattr(state, attribute, saved[attribute])
+
+        # Layer scripts rendered by another folium version are rebuilt
+        if saved['folium_version'] != folium.__version__:
+            state.fragments = {}
+
+        return state
+
+    def save(self, path=REFRESH_STATE_PATH):
+        """
+        Save tables, aggregates and layer scripts as a plain dict, so the file loads
+        no matter which module ran the refresh (the polygon index is supplied on load)
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        saved = {attribute: getattr(self, attribute) for attribute in STATE_ATTRIBUTES}
+        saved['folium_version'] = folium.__version__
+
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(saved, f)
+        os.replace(path + '.tmp', path)
+
+    def refresh(self, records):
+        """
+        Apply the current directory export and return a dict describing what changed
+        """
+        indexed = index_records(records)
+        added, removed, changed = diff_records(self.hashes, indexed)
+
+        print(f"Refresh: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+
+        if self.parsed_df is None:
+            self.parsed_df = pd.DataFrame(columns=['record_key'])
+            self.services_df = self.parsed_df
+
+        # A state saved without a polygon index gets its zips once one is available
+        if self.zip_index is not None and len(self.parsed_df) and 'spatial_zip' not in self.parsed_df:
+            self.parsed_df['spatial_zip'] = self._spatial_zips(self.parsed_df)
+            self.zip_counts = None
+
+        # Parse only new and changed records; removed and replaced rows leave the table
+        stale_keys = removed | changed
+        fresh_keys = sorted(added | changed)
+        fresh_rows = self._parse_records([indexed[key][0] for key in fresh_keys], fresh_keys)
+
+        parsed_df = self.parsed_df[~self.parsed_df['record_key'].isin(stale_keys)]
+        self.parsed_df = pd.concat([parsed_df, fresh_rows], ignore_index=True) if len(fresh_rows) else parsed_df
+        self.hashes = {key: content_hash for key, (_, content_hash) in indexed.items()}
+
+        # Deduplicate the whole table like main() does; a change can move which record survives
+        old_services = self.services_df
+        self.services_df = deduplicate_services(self.parsed_df) if len(self.parsed_df) else self.parsed_df
+
+        old_keys, new_keys = set(old_services['record_key']), set(self.services_df['record_key'])
+        touched = (old_keys ^ new_keys) | set(fresh_keys) | stale_keys
+        affected_rows = pd.concat([old_services[old_services['record_key'].isin(touched)],
+                                   self.services_df[self.services_df['record_key'].isin(touched)]])
+
+        affected_types = set(affected_rows.get('service_type', []))
+        affected_zips = {z for z in affected_rows.get('spatial_zip', []) if pd.notna(z)}
+
+        self._update_zip_counts(affected_zips)
+        self._update_fragments(affected_types)
+
+        return {
+            'added': added,
+            'removed': removed,
+            'changed': changed,
+            'affected_service_types': affected_types,
+            'affected_zips': affected_zips
+        }
+
+    def _parse_records(self, records, keys):
+        """Run the regular parsing steps on a subset of records"""
+        if not records:
+            return pd.DataFrame()
+
+        rows = extract_service_info(records)
+        rows['record_key'] = keys
+        rows = add_coordinates_to_services(rows)
+
+        if self.zip_index is not None:
+            rows['spatial_zip'] = self._spatial_zips(rows)
+
+        return rows
+
+    def _spatial_zips(self, df):
+        """Polygon zip per row; like main(), only rows with record coordinates are joined"""
+        located = df['has_location'].to_numpy(dtype=bool)
+        zips = np.full(len(df), None, dtype=object)
+        zips[located] = self.zip_index.assign(df['longitude'].to_numpy()[located], df['latitude'].to_numpy()[located])
+        return zips
+
+    def _update_zip_counts(self, affected_zips):
+        """Recount services by type for the affected zips only"""
+        if self.zip_index is None or 'spatial_zip' not in self.services_df:
+            return
+
+        if self.zip_counts is None:
+            self.zip_counts = pd.crosstab(self.services_df['spatial_zip'], self.services_df['service_type'])
+            return
+
+        if not affected_zips:
+            return
+
+        subset = self.services_df[self.services_df['spatial_zip'].isin(affected_zips)]
+        recounted = pd.crosstab(subset['spatial_zip'], subset['service_type'])
+
+        counts = self.zip_counts.drop(index=list(affected_zips), errors='ignore')
+        self.zip_counts = pd.concat([counts, recounted]).fillna(0).astype(int).sort_index()
+
+    def _update_fragments(self, affected_types):
+        """Re-render map layer scripts for affected service types only"""
+        types = set(self.services_df['service_type']) if len(self.services_df) else set()
+
+        for service_type in sorted(types):
+            if service_type in affected_types or service_type not in self.fragments:
+                self.fragments[service_type] = build_layer_fragments(self.services_df, service_type)
+
+        for service_type in list(self.fragments):
+            if service_type not in types:
+                del self.fragments[service_type]
+
+
+def refresh_services(state_path=REFRESH_STATE_PATH, zip_index=None):
+    """
+    Incremental alternative to improved_services_map.main for scheduled refresh jobs.
+    The zip polygon index is loaded like main() does unless one is supplied.
+    """
+    services_data = load_homeless_services_data()
+    if services_data is None:
+        print("Could not load services data. Exiting.")
+        return None
+
+    if zip_index is None:
+        zip_index = load_zip_index()
+
+    state = ServicesRefreshState.load(state_path, zip_index)
+    changes = state.refresh(services_data)
+
+    if changes['affected_service_types'] or not os.path.exists('enhanced_homeless_services_map.html'):
+        create_enhanced_services_map(state.services_df, fragments=state.fragments)
+    else:
+        print("No changes - map left as is")
+
+    state.save(state_path)
+    return state, changes
+
+
+if __name__ == "__main__":
+    refresh_services()
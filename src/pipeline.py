@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Pipeline Runner
+Memoized stage graph: each stage's output is cached on disk by a hash of its
+code, parameters and inputs, only dirty stages re-run and independent stages
+run at the same time
+"""
+
+import os
+import pickle
+import hashlib
+import inspect
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+PIPELINE_CACHE_DIR = '../cache/pipeline'
+
+
+def code_source(obj):
+    """Source of a function or class; a stable repr of a constant (sets in sorted order)"""
+    if callable(obj):
+        return inspect.getsource(obj)
+    if isinstance(obj, (set, frozenset)):
+        return repr(sorted(obj))
+    return repr(obj)
+
+
+class Stage:
+    """
+    One pipeline step: func(*input_outputs, **params).
+    code lists the functions a thin stage wrapper calls, including the helpers
+    they call, and any constants they read; their source (or repr) is part of
+    the stage's version. watch lists input files whose size and modification
+    time are part of it.
+    """
+
+    def __init__(self, name, func, inputs=(), params=None, code=(), watch=()):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = params or {}
+        self.code = list(code)
+        self.watch = list(watch)
+
+    def code_version(self):
+        source = ''.join(code_source(f) for f in [self.func] + self.code)
+        for path in self.watch:
+            if os.path.exists(path):
+                stat = os.stat(path)
+                source += f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+class Pipeline:
+    """Stage graph with an on-disk cache of stage outputs"""
+
+    def __init__(self, cache_dir=PIPELINE_CACHE_DIR, max_workers=4):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), params=None, code=(), watch=()):
+        """Register a stage; inputs must already be registered"""
+        missing = [i for i in inputs if i not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {missing}")
+        self.stages[name] = Stage(name, func, inputs, params, code, watch)
+        return self
+
+    def stage_keys(self):
+        """Cache key per stage; a change upstream changes every downstream key"""
+        keys = {}
+        for name, stage in self.stages.items():
+            payload = stage.code_version() + repr(sorted(stage.params.items()))
+            payload += ''.join(keys[i] for i in stage.inputs)
+            keys[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+        return keys
+
+    def cache_path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key}.pkl")
+
+    def required_stages(self, targets):
+        """Targets plus everything upstream of them"""
+        required = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(self.stages[name].inputs)
+        return required
+
+    def run(self, targets=None, force=()):
+        """
+        Run the pipeline and return {stage name: output} for the required stages.
+        Stages whose cache entry exists are loaded instead of executed;
+        stages listed in force always re-run.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        targets = list(self.stages) if targets is None else list(targets)
+        required = self.required_stages(targets)
+        keys = self.stage_keys()
+
+        dirty = {name for name in required
+                 if name in force or not os.path.exists(self.cache_path(name, keys[name]))}
+
+        # Forced stages invalidate everything downstream (stages are in topological order)
+        for name, stage in self.stages.items():
+            if name in required and any(i in dirty for i in stage.inputs):
+                dirty.add(name)
+        print(f"Pipeline: {len(dirty)} of {len(required)} stages to run")
+
+        outputs = {}
+
+        def load(name):
+            if name not in outputs:
+                with open(self.cache_path(name, keys[name]), 'rb') as f:
+                    outputs[name] = pickle.load(f)
+            return outputs[name]
+
+        def execute(name):
+            stage = self.stages[name]
+            args = [outputs[i] if i in outputs else load(i) for i in stage.inputs]
+            print(f"  running {name}...")
+            result = stage.func(*args, **stage.params)
+
+            tmp_path = self.cache_path(name, keys[name]) + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(result, f)
+            os.replace(tmp_path, self.cache_path(name, keys[name]))
+            return result
+
+        # Dirty stages run as soon as their dirty inputs are done
+        remaining = {name for name in self.stages if name in dirty}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining or running:
+                ready = [name for name in remaining
+                         if not any(i in remaining or i in running.values() for i in self.stages[name].inputs)]
+                for name in ready:
+                    # Clean inputs are loaded here so worker threads only read from outputs
+                    for i in self.stages[name].inputs:
+                        if i not in dirty:
+                            load(i)
+                    remaining.discard(name)
+                    running[executor.submit(execute, name)] = name
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    outputs[running.pop(future)] = future.result()
+
+        for name in targets:
+            load(name)
+
+        return {name: outputs[name] for name in required if name in outputs}
+
+
+def build_demo_pipeline(cache_dir=PIPELINE_CACHE_DIR, top_n=5):
+    """Stage graph equivalent of base.run_hackathon_demo"""
+    import base
+    import hotspots as hs
+    import uncertainty as unc
+    import report_builder as rb
+    from base import HackathonHomelessModel, raw_need_score
+    from report_builder import build_report
+    from hotspots import hotspot_analysis
+    from uncertainty import need_score_uncertainty
+
+    model_class = HackathonHomelessModel
+
+    def load():
+        return model_class().generate_mock_data()
+
+    def score(df):
+        return model_class().calculate_service_gaps(df.copy())
+
+    def train(df):
+        model = model_class()
+        feature_importance = model.train_predictive_model(df)
+        return model, feature_importance
+
+    def prioritize(df, top_n):
+        return model_class().identify_priority_areas(df, top_n=top_n)
+
+    def uncertainty(df, priority_areas):
+        return need_score_uncertainty(df, top_n=len(priority_areas))
+
+    def recommend(df, priority_areas):
+        return model_class().recommend_interventions(priority_areas, df)
+
+    def find_hotspots(df):
+        return hotspot_analysis(df, weight_col='capacity_gap', eps_km=3.0, min_weight=100)
+
+    def render_map(df, priority_areas, hotspots):
+        model_class().create_dashboard_map(df, priority_areas, hotspots).save('san_diego_homeless_services_map.html')
+        return 'san_diego_homeless_services_map.html'
+
+    def render_charts(df, priority_areas, trained):
+        return model_class().create_analysis_charts(df, priority_areas, trained[1])
+
+    def summarize(df, priority_areas, recommendations):
+        return model_class().generate_executive_summary(df, priority_areas, recommendations)
+
+    def render_report(charts, summary):
+        return build_report(charts, summary)
+
+    pipeline = Pipeline(cache_dir)
+    pipeline.add('load', load, code=[model_class.generate_mock_data])
+    pipeline.add('score', score, ['load'], code=[model_class.calculate_service_gaps, raw_need_score])
+    pipeline.add('train', train, ['score'], code=[model_class.train_predictive_model])
+    pipeline.add('prioritize', prioritize, ['score'], params={'top_n': top_n},
+                 code=[model_class.identify_priority_areas])
+    pipeline.add('uncertainty', uncertainty, ['score', 'prioritize'],
+                 code=[need_score_uncertainty, unc.simulate_need_scores, unc.perturb_inputs, raw_need_score,
+                       unc.SERVICE_COLUMNS, unc.DRAW_CHUNK_SIZE])
+    pipeline.add('recommend', recommend, ['score', 'prioritize'], code=[model_class.recommend_interventions])
+    pipeline.add('hotspots', find_hotspots, ['score'],
+                 code=[hotspot_analysis, hs.project_km, hs.minibatch_kmeans_labels, hs.grid_density_labels,
+                       hs.resolve_n_jobs, hs.EARTH_RADIUS_KM, hs.NEIGHBOUR_OFFSETS])
+    pipeline.add('render_map', render_map, ['score', 'prioritize', 'hotspots'], code=[model_class.create_dashboard_map])
+    pipeline.add('render_charts', render_charts, ['score', 'prioritize', 'train'],
+                 code=[model_class.create_analysis_charts, base.binned_histogram, base.precomputed_box,
+                       base.downsample, base.LARGE_DATA_THRESHOLD])
+    pipeline.add('summarize', summarize, ['score', 'prioritize', 'recommend'],
+                 code=[model_class.generate_executive_summary])
+    pipeline.add('render_report', render_report, ['render_charts', 'summarize'],
+                 code=[build_report, rb.render_charts, rb.render_chart, rb.chart_hash, rb.CHART_NAMES])
+    return pipeline
+
+
+def build_services_pipeline(cache_dir=PIPELINE_CACHE_DIR):
+    """Stage graph equivalent of improved_services_map.main"""
+    import improved_services_map as ism
+    import deduplication as dd
+    from deduplication import deduplicate_services
+
+    def parse(records):
+        return deduplicate_services(ism.extract_service_info(records))
+
+    def geocode(services_df):
+        return ism.add_coordinates_to_services(services_df.copy())
+
+    def render(map_func, filename):
+        def render_stage(services_df):
+            map_func(services_df)
+            return filename
+        return render_stage
+
+    pipeline = Pipeline(cache_dir)
+    pipeline.add('load', ism.load_homeless_services_data, watch=['../assets/homeless_services_hackathon.json'])
+    pipeline.add('parse', parse, ['load'],
+                 code=[ism.extract_service_info, ism.normalize_addresses, ism.UNIT_PATTERNS, ism.ADDRESS_NOTE_PATTERN,
+                       ism.TRAILING_ZIP_PATTERN, ism.STATE_ZIP_PATTERN,
+                       deduplicate_services, dd.normalize_text, dd.normalize_phone, dd.shingle_hashes, dd.shingle_set,
+                       dd.minhash_signatures, dd.jaccard, dd.name_similarity, dd.lsh_candidate_pairs, dd.unique_pairs,
+                       dd.cluster_duplicates, dd.NAME_ABBREVIATIONS, dd.NAME_STOPWORDS])
+    pipeline.add('geocode', geocode, ['parse'], code=[ism.add_coordinates_to_services, ism.get_san_diego_coordinates])
+    pipeline.add('render_enhanced_map', render(ism.create_enhanced_services_map, 'enhanced_homeless_services_map.html'),
+                 ['geocode'], code=[ism.create_enhanced_services_map, ism.build_service_layer, ism.build_search_markers,
+                                    ism.SERVICE_CONFIG])
+    pipeline.add('render_clustered_map', render(ism.create_service_clusters_map, 'clustered_services_map.html'),
+                 ['geocode'], code=[ism.create_service_clusters_map])
+    pipeline.add('render_heatmap', render(ism.create_service_density_heatmap, 'services_density_heatmap.html'),
+                 ['geocode'], code=[ism.create_service_density_heatmap])
+    return pipeline
+
+
+if __name__ == "__main__":
+    results = build_demo_pipeline().run()
+    print(results['summarize'])
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+San Diego Point-in-Time Count Store
+Year-partitioned columnar store of PIT counts with lazy per-year loading
+and vectorized year-over-year delta and trend queries
+"""
+
+import os
+import re
+import pandas as pd
+import numpy as np
+
+PIT_WORKBOOK_PATH = '../assets/2025_and_2024_PITC_hackathon.xlsx'
+PIT_STORE_PATH = '../cache/pit_store'
+
+COUNT_COLUMNS = ['emergency_shelter', 'transitional_housing', 'safe_haven', 'sheltered', 'unsheltered']
+
+
+def parse_pit_sheet(path, sheet_name):
+    """Parse one RTFH regional breakdown sheet into one row per jurisdiction"""
+    raw = pd.read_excel(path, sheet_name=sheet_name, header=None)
+
+    # Data starts below the 'Region | City | ES | TH | SH | ...' header row
+    header_row = raw.index[raw[1].astype(str).str.strip() == 'Region'][0]
+    body = raw.iloc[header_row + 1:, 1:8]
+    body.columns = ['region', 'jurisdiction'] + COUNT_COLUMNS
+
+    body = body[body['jurisdiction'].notna()]
+    body = body[body['jurisdiction'].astype(str).str.strip().str.upper() != 'TOTAL']
+
+    counts = pd.DataFrame({
+        'region': body['region'].ffill().astype(str).str.strip(),
+        'jurisdiction': body['jurisdiction'].astype(str).str.strip(),
+        'unincorporated': body['jurisdiction'].astype(str).str.contains(r'\*'),
+    })
+    counts['jurisdiction'] = counts['jurisdiction'].str.rstrip('*').str.strip()
+
+    # Footnote markers ('38**') are stripped before converting to numbers
+    for column in COUNT_COLUMNS:
+        values = body[column].astype(str).str.replace(r'[^\d.\-]', '', regex=True)
+        counts[column] = pd.to_numeric(values, errors='coerce').fillna(0).astype('int32')
+
+    counts['total'] = counts['sheltered'] + counts['unsheltered']
+    return counts.reset_index(drop=True)
+
+
+class PITCountStore:
+    """
+    PIT counts stored as one parquet partition per year (year=YYYY/counts.parquet).
+    Partitions are read on first use and kept in memory.
+    """
+
+    def __init__(self, root=PIT_STORE_PATH):
+        self.root = root
+        self._partitions = {}
+
+    def partition_path(self, year):
+        return os.path.join(self.root, f"year={int(year)}", 'counts.parquet')
+
+    def years(self):
+        """Years available in the store (no partitions are read)"""
+        if not os.path.isdir(self.root):
+            return []
+        years = [int(m.group(1)) for name in os.listdir(self.root)
+                 if (m := re.fullmatch(r'year=(\d{4})', name))]
+        return sorted(years)
+
+    def append_year(self, year, counts, overwrite=False):
+        """Write a year's counts (one row per jurisdiction or zip) as a new partition"""
+        path = self.partition_path(year)
+        if os.path.exists(path) and not overwrite:
+            raise ValueError(f"PIT counts for {year} already stored (use overwrite=True to replace)")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        counts = counts.drop(columns='year', errors='ignore')
+        counts.to_parquet(path, index=False)
+        self._partitions.pop(int(year), None)
+
+    def import_workbook(self, path=PIT_WORKBOOK_PATH, overwrite=False):
+        """Append every year sheet of an RTFH workbook"""
+        sheets = pd.ExcelFile(path).sheet_names
+        for sheet_name in sheets:
+            if re.fullmatch(r'\d{4}', str(sheet_name).strip()):
+                year = int(sheet_name)
+                if overwrite or year not in self.years():
+                    self.append_year(year, parse_pit_sheet(path, sheet_name), overwrite=overwrite)
+                    print(f"Stored PIT counts for {year}")
+
+    def load(self, year, columns=None):
+        """Counts for one year, read lazily from its partition"""
+        year = int(year)
+        if year not in self._partitions:
+            frame = pd.read_parquet(self.partition_path(year))
+            frame.insert(0, 'year', year)
+            self._partitions[year] = frame
+        frame = self._partitions[year]
+        return frame if columns is None else frame[['year'] + list(columns)]
+
+    def counts(self, years=None, columns=None):
+        """Long table of counts for the requested years (all years by default)"""
+        years = self.years() if years is None else years
+        return pd.concat([self.load(y, columns) for y in years], ignore_index=True)
+
+    def trend(self, key='jurisdiction', value='unsheltered', years=None):
+        """Wide table of value by key (rows) and year (columns)"""
+        years = self.years() if years is None else sorted(years)
+        long = self.counts(years, columns=[key, value])
+        return long.pivot_table(index=key, columns='year', values=value, aggfunc='sum').reindex(columns=years)
+
+    def deltas(self, year, base_year=None, key='jurisdiction', value='unsheltered'):
+        """Change in value between base_year (default: previous stored year) and year"""
+        if base_year is None:
+            earlier = [y for y in self.years() if y < year]
+            if not earlier:
+                raise ValueError(f"No PIT counts stored before {year}")
+            base_year = earlier[-1]
+
+        wide = self.trend(key, value, years=[base_year, year])
+        base, current = wide[base_year], wide[year]
+
+        return pd.DataFrame({
+            f"{value}_{base_year}": base,
+            f"{value}_{year}": current,
+            'change': current - base,
+            'pct_change': (current - base) / base.replace(0, np.nan)
+        })
+
+    def growth_features(self, key='jurisdiction', value='unsheltered', years=None):
+        """
+        Per-key growth features for need scoring: latest count, latest
+        year-over-year growth and compound annual growth over the stored years
+        """
+        wide = self.trend(key, value, years)
+        first_year, last_year = wide.columns[0], wide.columns[-1]
+
+        yoy = wide.pct_change(axis=1, fill_method=None).replace([np.inf, -np.inf], np.nan)
+        span = max(last_year - first_year, 1)
+        cagr = (wide[last_year] / wide[first_year].replace(0, np.nan)) ** (1 / span) - 1
+
+        return pd.DataFrame({
+            f"{value}_latest": wide[last_year],
+            'pit_growth': yoy[last_year] if len(wide.columns) > 1 else np.nan,
+            'pit_cagr': cagr
+        })
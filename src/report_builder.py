@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Report Builder
+Renders analysis charts in parallel worker processes, caches each rendered chart
+by a hash of its figure data and assembles a single self-contained HTML report
+(plus static chart images next to it when kaleido is installed)
+"""
+
+import os
+import html
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import plotly.io as pio
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+REPORT_CACHE_DIR = '../cache/charts'
+
+CHART_NAMES = ['need_score_distribution', 'capacity_gap_by_region', 'feature_importance', 'priority_areas']
+
+
+def chart_hash(fig):
+    """Hash of a figure's data and layout (and the plotly.js version it is rendered for)"""
+    payload = get_plotlyjs_version() + fig.to_json()
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def static_images_available():
+    """Static image export needs the optional kaleido package"""
+    try:
+        import kaleido  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def render_chart(fig_json, html_path, image_path=None):
+    """Render one figure to an HTML fragment (and optionally a static image) - runs in a worker process"""
+    fig = pio.from_json(fig_json)
+
+    fragment = pio.to_html(fig, include_plotlyjs=False, full_html=False)
+    tmp_path = html_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(fragment)
+    os.replace(tmp_path, html_path)
+
+    if image_path:
+        fig.write_image(image_path, width=1000, height=600)
+
+    return html_path
+
+
+def render_charts(charts, cache_dir=REPORT_CACHE_DIR, image_format='png', max_workers=None):
+    """
+    Render charts whose data changed since the last run; cached renders are reused.
+    Returns a list of (name, html_path, image_path) in chart order.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if image_format and not static_images_available():
+        print("kaleido not installed - skipping static images")
+        image_format = None
+
+    rendered = []
+    jobs = []
+
+    for name, fig in charts.items():
+        key = chart_hash(fig)
+        html_path = os.path.join(cache_dir, f"{name}-{key}.html")
+        image_path = os.path.join(cache_dir, f"{name}-{key}.{image_format}") if image_format else None
+
+        cached = os.path.exists(html_path) and (image_path is None or os.path.exists(image_path))
+        if not cached:
+            jobs.append((fig.to_json(), html_path, image_path))
+        rendered.append((name, html_path, image_path))
+
+    print(f"Rendering {len(jobs)} of {len(charts)} charts ({len(charts) - len(jobs)} cached)")
+
+    if len(jobs) == 1:
+        render_chart(*jobs[0])
+    elif jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(render_chart, *zip(*jobs)))
+
+    return rendered
+
+
+def build_report(charts, summary, output_path='hackathon_report.html', cache_dir=REPORT_CACHE_DIR,
+                 image_format='png', max_workers=None):
+    """
+    Assemble the executive summary and charts into a single HTML report that works
+    offline (plotly.js is inlined once in the page head). Static images are copied
+    to <report name>_images/<chart name>.<format> next to the report.
+    charts can be the tuple from create_analysis_charts or a dict of name -> figure.
+    """
+    print("\nBuilding report...")
+
+    if not isinstance(charts, dict):
+        charts = dict(zip(CHART_NAMES, charts))
+
+    rendered = render_charts(charts, cache_dir, image_format, max_workers)
+
+    # Stable image names next to the report; the cache keeps the hashed copies
+    images_dir = os.path.splitext(output_path)[0] + '_images'
+    sections = []
+    for name, html_path, image_path in rendered:
+        with open(html_path, 'r', encoding='utf-8') as f:
+            section = f.read()
+        if image_path:
+            os.makedirs(images_dir, exist_ok=True)
+            shared_path = os.path.join(images_dir, f"{name}{os.path.splitext(image_path)[1]}")
+            shutil.copyfile(image_path, shared_path)
+            link = os.path.relpath(shared_path, os.path.dirname(output_path) or '.').replace(os.sep, '/')
+            section += f'<p><a href="{html.escape(link)}">Static image</a></p>'
+        sections.append(f'<section id="{name}">{section}</section>')
+
+    report = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>San Diego Homeless Services Gap Analysis</title>
+<script type="text/javascript">{get_plotlyjs()}</script>
+<style>
+    body {{ font-family: Arial, sans-serif; max-width: 1100px; margin: 0 auto; padding: 20px; }}
+    pre {{ background: #f5f5f5; padding: 15px; white-space: pre-wrap; }}
+    section {{ margin: 30px 0; }}
+</style>
+</head>
+<body>
+<h1>San Diego Homeless Services Gap Analysis</h1>
+<pre>{html.escape(summary)}</pre>
+{''.join(sections)}
+</body>
+</html>
+"""
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(report)
+
+    print(f"Report saved as '{output_path}'")
+    return output_path
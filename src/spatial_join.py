@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+San Diego Zip Code Spatial Join
+Assigns services, transit stops and PIT counts to zip code polygons using an STRtree
+"""
+
+import os
+import pandas as pd
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.strtree import STRtree
+
+# Zip code boundaries listed under 'Mapping' in assets/README.txt. The file is not
+# checked in - export San Diego County zip code polygons (e.g. SANDAG zip code
+# boundaries or Census ZCTAs) to this path to enable the spatial join.
+ZIP_POLYGONS_PATH = '../assets/sd_zipcodes.geojson'
+TRANSIT_STOPS_PATH = '../assets/Transit_Stops_hackathon.csv'
+
+# California Albers (meters) - used for polygon areas
+AREA_CRS = 'EPSG:3310'
+
+# Common names for the zip column in zip code boundary files
+ZIP_COLUMN_CANDIDATES = ['zip_code', 'zip', 'ZIP', 'zipcode', 'ZIPCODE', 'ZCTA5CE20', 'ZCTA5CE10', 'GEOID20', 'GEOID10']
+
+# Service types that feed the model's per-zip facility columns
+MODEL_SERVICE_COLUMNS = {
+    'Mental Health': 'mental_health_services',
+    'Employment': 'job_training_centers',
+    'Medical/Health': 'healthcare_facilities',
+}
+
+
+class ZipPolygonIndex:
+    """
+    Prepared zip code polygons in an STRtree for bulk point-in-polygon lookups
+    """
+
+    def __init__(self, zip_gdf):
+        self.zip_gdf = zip_gdf.reset_index(drop=True)
+        self.zip_codes = self.zip_gdf['zip_code'].to_numpy()
+        self.geometries = self.zip_gdf.geometry.to_numpy()
+
+        # Prepared geometries make repeated predicate checks much cheaper
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+        # Polygon areas in square kilometers
+        self.area_km2 = self.zip_gdf.geometry.to_crs(AREA_CRS).area.to_numpy() / 1e6
+
+    def assign(self, lons, lats):
+        """Return the zip code containing each point (None where no polygon matches)"""
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        result = np.full(len(lons), None, dtype=object)
+
+        valid = ~(np.isnan(lons) | np.isnan(lats))
+        if not valid.any():
+            return result
+
+        points = shapely.points(lons[valid], lats[valid])
+        point_idx, poly_idx = self.tree.query(points, predicate='intersects')
+
+        # A point on a shared border matches several polygons - keep the first
+        point_idx, first = np.unique(point_idx, return_index=True)
+        valid_positions = np.flatnonzero(valid)
+        result[valid_positions[point_idx]] = self.zip_codes[poly_idx[first]]
+
+        return result
+
+
+def load_zip_polygons(path=ZIP_POLYGONS_PATH):
+    """Load zip code boundaries as a WGS84 GeoDataFrame with a string 'zip_code' column"""
+    print("Loading zip code polygons...")
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Zip code polygons not found at {path} (see ZIP_POLYGONS_PATH)")
+
+    zip_gdf = gpd.read_file(path)
+
+    zip_column = next((c for c in ZIP_COLUMN_CANDIDATES if c in zip_gdf.columns), None)
+    if zip_column is None:
+        raise ValueError(f"No zip code column found in {path}")
+
+    zip_gdf = zip_gdf.rename(columns={zip_column: 'zip_code'})
+    zip_gdf['zip_code'] = zip_gdf['zip_code'].astype(str).str[:5]
+
+    if zip_gdf.crs is None:
+        zip_gdf = zip_gdf.set_crs('EPSG:4326')
+    else:
+        zip_gdf = zip_gdf.to_crs('EPSG:4326')
+
+    # Multi-part zip codes are stored as several rows in some files
+    zip_gdf = zip_gdf.dissolve(by='zip_code', as_index=False)[['zip_code', 'geometry']]
+
+    print(f"Loaded {len(zip_gdf)} zip code polygons")
+    return zip_gdf
+
+
+def load_zip_index(path=ZIP_POLYGONS_PATH):
+    """ZipPolygonIndex for the zip code polygons, or None when the polygon file is missing"""
+    try:
+        return ZipPolygonIndex(load_zip_polygons(path))
+    except FileNotFoundError as e:
+        print(f"Spatial join unavailable, using address zip codes: {e}")
+        return None
+
+
+def load_transit_stops(path=TRANSIT_STOPS_PATH):
+    """Load transit stop locations and wheelchair accessibility"""
+    print("Loading transit stops...")
+
+    stops_df = pd.read_csv(path, encoding='utf-8-sig',
+                           usecols=['stop_uid', 'stop_name', 'stop_lat', 'stop_lon', 'wheelchair_boarding'])
+    stops_df = stops_df.rename(columns={'stop_lat': 'latitude', 'stop_lon': 'longitude'})
+
+    # GTFS convention: 1 = accessible, 2 = not accessible, 0/empty = unknown
+    stops_df['accessible'] = stops_df['wheelchair_boarding'].fillna(0).astype(int) == 1
+
+    print(f"Loaded {len(stops_df)} transit stops")
+    return stops_df
+
+
+def assign_zip_codes(df, zip_index, lat_col='latitude', lon_col='longitude'):
+    """Return a copy of df with a 'spatial_zip' column from the polygon lookup"""
+    df = df.copy()
+    df['spatial_zip'] = zip_index.assign(df[lon_col], df[lat_col])
+    return df
+
+
+def build_zip_aggregates(zip_index, services_df=None, stops_df=None, pit_df=None, pit_count_col='homeless_count'):
+    """
+    Build per-zip counts of services by type, transit stop density and accessibility,
+    and PIT counts from point data joined onto the zip polygons
+    """
+    aggregates = pd.DataFrame({
+        'zip_code': zip_index.zip_codes,
+        'area_km2': zip_index.area_km2
+    }).set_index('zip_code')
+
+    if services_df is not None:
+        services = assign_zip_codes(services_df, zip_index)
+        type_counts = pd.crosstab(services['spatial_zip'], services['service_type'])
+        aggregates['num_services'] = type_counts.sum(axis=1)
+        type_counts.columns = ['services_' + str(c).lower().replace('/', '_').replace(' ', '_')
+                               for c in type_counts.columns]
+        aggregates = aggregates.join(type_counts)
+
+    if stops_df is not None:
+        stops = assign_zip_codes(stops_df, zip_index)
+        stop_stats = stops.groupby('spatial_zip').agg(
+            num_stops=('accessible', 'size'),
+            accessible_stops=('accessible', 'sum')
+        )
+        aggregates = aggregates.join(stop_stats)
+        aggregates[['num_stops', 'accessible_stops']] = aggregates[['num_stops', 'accessible_stops']].fillna(0)
+        aggregates['stop_density'] = aggregates['num_stops'] / aggregates['area_km2']
+        aggregates['stop_accessibility'] = (aggregates['accessible_stops'] /
+                                            aggregates['num_stops'].replace(0, np.nan)).fillna(0)
+
+    if pit_df is not None:
+        pit = assign_zip_codes(pit_df, zip_index)
+        aggregates[pit_count_col] = pit.groupby('spatial_zip')[pit_count_col].sum()
+
+    count_columns = [c for c in aggregates.columns if c == 'num_services' or c.startswith('services_')]
+    aggregates[count_columns] = aggregates[count_columns].fillna(0).astype(int)
+
+    return aggregates
+
+
+def services_by_zip(zip_aggregates):
+    """Return the per-zip service columns in the layout HackathonHomelessModel expects"""
+    model_columns = pd.DataFrame(index=zip_aggregates.index)
+    model_columns['num_services'] = zip_aggregates['num_services']
+
+    for service_type, column in MODEL_SERVICE_COLUMNS.items():
+        source = 'services_' + service_type.lower().replace('/', '_').replace(' ', '_')
+        model_columns[column] = zip_aggregates[source] if source in zip_aggregates else 0
+
+    for column in ['num_stops', 'stop_density', 'stop_accessibility']:
+        if column in zip_aggregates:
+            model_columns[column] = zip_aggregates[column]
+
+    return model_columns
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+San Diego Homeless Services Need Score Uncertainty
+Monte Carlo bands for need scores and priority ranks, computed as one
+(draws x zips) array per batch instead of a Python loop per draw
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from base import raw_need_score
+
+# Draws per random stream; chunks (not workers) get their own seed
+DRAW_CHUNK_SIZE = 500
+
+SERVICE_COLUMNS = ['mental_health_services', 'substance_abuse_services', 'job_training_centers', 'healthcare_facilities']
+
+
+def perturb_inputs(inputs, n_draws, rng, pit_cv=0.15, capacity_cv=0.2):
+    """
+    Draw perturbed PIT counts and service capacities as (n_draws x zips) arrays.
+    Both use multiplicative lognormal noise with the given coefficient of variation;
+    facility counts are treated as known.
+    """
+    def lognormal_factor(cv, shape):
+        sigma = np.sqrt(np.log1p(cv ** 2))
+        return rng.lognormal(-sigma ** 2 / 2, sigma, size=shape)
+
+    shape = (n_draws, len(inputs['homeless_count']))
+    draws = {column: np.broadcast_to(values, shape) for column, values in inputs.items()}
+    draws['homeless_count'] = np.maximum(inputs['homeless_count'] * lognormal_factor(pit_cv, shape), 1)
+    draws['service_capacity'] = inputs['service_capacity'] * lognormal_factor(capacity_cv, shape)
+    return draws
+
+
+def simulate_need_scores(inputs, n_draws, seed, pit_cv=0.15, capacity_cv=0.2, growth_weight=0.1):
+    """Normalized need scores for n_draws realizations, shape (n_draws, zips)"""
+    rng = np.random.default_rng(seed)
+    draws = perturb_inputs(inputs, n_draws, rng, pit_cv, capacity_cv)
+
+    scores = raw_need_score(
+        draws['homeless_count'], draws['service_capacity'],
+        *(draws[column] for column in SERVICE_COLUMNS),
+        pit_growth=draws.get('pit_growth'), growth_weight=growth_weight
+    )
+
+    # Normalize each draw to 0-100 like calculate_service_gaps
+    low = scores.min(axis=1, keepdims=True)
+    span = scores.max(axis=1, keepdims=True) - low
+    return (scores - low) / np.where(span == 0, 1, span) * 100
+
+
+def need_score_uncertainty(df, n_draws=5000, top_n=5, pit_cv=0.15, capacity_cv=0.2,
+                           growth_weight=0.1, confidence=0.9, n_jobs=1, seed=42):
+    """
+    Confidence intervals for each zip's need score and rank, and the probability
+    that each zip is among the top_n priority areas.
+    n_jobs > 1 splits the draws across a process pool; results do not depend on n_jobs.
+    """
+    print(f"Running {n_draws} Monte Carlo draws...")
+
+    columns = ['homeless_count', 'service_capacity'] + SERVICE_COLUMNS
+    if 'pit_growth' in df:
+        columns.append('pit_growth')
+    inputs = {column: df[column].to_numpy(dtype=float) for column in columns}
+
+    # One seed per fixed-size chunk of draws, so the same draws come out whatever n_jobs is
+    chunk_sizes = [min(DRAW_CHUNK_SIZE, n_draws - start) for start in range(0, n_draws, DRAW_CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    args = [(inputs, size, s, pit_cv, capacity_cv, growth_weight) for size, s in zip(chunk_sizes, seeds)]
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            scores = np.vstack(list(executor.map(simulate_need_scores, *zip(*args))))
+    else:
+        scores = np.vstack([simulate_need_scores(*a) for a in args])
+
+    # Rank 1 = highest need in that draw
+    ranks = np.empty_like(scores, dtype=np.int32)
+    order = np.argsort(-scores, axis=1)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1, dtype=np.int32)[None, :], axis=1)
+
+    alpha = (1 - confidence) / 2
+    score_q = np.quantile(scores, [alpha, 0.5, 1 - alpha], axis=0)
+    rank_q = np.quantile(ranks, [alpha, 0.5, 1 - alpha], axis=0)
+
+    result = pd.DataFrame({
+        'zip_code': df['zip_code'].to_numpy(),
+        'need_score_mean': scores.mean(axis=0),
+        'need_score_low': score_q[0],
+        'need_score_median': score_q[1],
+        'need_score_high': score_q[2],
+        'rank_low': rank_q[0],
+        'rank_median': rank_q[1],
+        'rank_high': rank_q[2],
+        f'prob_top_{top_n}': (ranks <= top_n).mean(axis=0)
+    })
+    if 'region' in df:
+        result.insert(1, 'region', df['region'].to_numpy())
+
+    return result.sort_values(f'prob_top_{top_n}', ascending=False).reset_index(drop=True)
@@ -0,0 +1,23 @@
+from improved_services_map import normalize_addresses
+
+
+def test_data_dictionary_address_with_trailing_notes():
+    # Example from the homeless_services_hackathon.json data dictionary
+    clean, zip_codes = normalize_addresses(['439 IOWA STFALLBROOK, CA 92028Confidential:Get Directions'])
+    assert clean.iloc[0] == '439 IOWA STFALLBROOK, CA 92028'
+    assert zip_codes.iloc[0] == '92028'
+
+
+def test_street_names_are_not_unit_designators():
+    clean, zip_codes = normalize_addresses(['1234 Stevens Ave, San Diego, CA 92101',
+                                            '500 Unity Way, San Diego, CA 92102',
+                                            '12 Aptos St, San Diego, CA 92103, United States'])
+    assert clean.tolist() == ['1234 Stevens Ave, San Diego, CA 92101',
+                              '500 Unity Way, San Diego, CA 92102',
+                              '12 Aptos St, San Diego, CA 92103, United States']
+    assert zip_codes.tolist() == ['92101', '92102', '92103']
+
+
+def test_unit_designators_are_normalized():
+    clean, _ = normalize_addresses(['1 Main St ste. 200, San Diego, CA 92104'])
+    assert clean.iloc[0] == '1 Main St Suite 200, San Diego, CA 92104'
@@ -0,0 +1,25 @@
+import base
+from pipeline import build_demo_pipeline
+
+
+def changed_stages(tmp_path, monkeypatch, owner, name):
+    """Stages whose cache key changes when owner.name is replaced by an edited version"""
+    before = build_demo_pipeline(cache_dir=str(tmp_path)).stage_keys()
+
+    original = getattr(owner, name)
+
+    def edited(*args, **kwargs):
+        # stands in for an edit to the function body
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, edited)
+    after = build_demo_pipeline(cache_dir=str(tmp_path)).stage_keys()
+    return {stage for stage in before if before[stage] != after[stage]}
+
+
+def test_dashboard_map_edit_dirties_only_render_map(tmp_path, monkeypatch):
+    assert changed_stages(tmp_path, monkeypatch, base.HackathonHomelessModel, 'create_dashboard_map') == {'render_map'}
+
+
+def test_chart_helper_edit_dirties_charts_and_report(tmp_path, monkeypatch):
+    assert changed_stages(tmp_path, monkeypatch, base, 'binned_histogram') == {'render_charts', 'render_report'}